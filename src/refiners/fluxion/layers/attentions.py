@@ -1,15 +1,96 @@
 import math
+import os
+from contextlib import AbstractContextManager
+from functools import cache
+from typing import Any, Callable
 
 import torch
 from jaxtyping import Float
 from torch import Tensor, device as Device, dtype as DType
-from torch.nn.functional import scaled_dot_product_attention as _scaled_dot_product_attention  # type: ignore
+from torch.nn import Parameter as TorchParameter
+from torch.nn.functional import linear, scaled_dot_product_attention as _scaled_dot_product_attention  # type: ignore
 
-from refiners.fluxion.context import Contexts
 from refiners.fluxion.layers.basics import Identity
 from refiners.fluxion.layers.chain import Chain, Distribute, Lambda, Parallel
 from refiners.fluxion.layers.linear import Linear
-from refiners.fluxion.layers.module import Module
+from refiners.fluxion.layers.module import Module, WeightedModule
+
+try:
+    from torch.nn.attention import SDPBackend, sdpa_kernel  # type: ignore
+
+    def _causal_sdpa_kernels() -> AbstractContextManager[None] | None:
+        backends = [
+            backend
+            for backend, enabled in (
+                (SDPBackend.FLASH_ATTENTION, torch.backends.cuda.flash_sdp_enabled()),  # type: ignore
+                (SDPBackend.EFFICIENT_ATTENTION, torch.backends.cuda.mem_efficient_sdp_enabled()),  # type: ignore
+                (
+                    getattr(SDPBackend, "CUDNN_ATTENTION", None),
+                    getattr(torch.backends.cuda, "cudnn_sdp_enabled", lambda: False)(),
+                ),
+            )
+            if enabled
+        ]
+        return sdpa_kernel(backends) if backends else None  # type: ignore
+
+except ImportError:  # torch < 2.3
+
+    def _causal_sdpa_kernels() -> AbstractContextManager[None] | None:
+        flash, mem_efficient = torch.backends.cuda.flash_sdp_enabled(), torch.backends.cuda.mem_efficient_sdp_enabled()
+        if not (flash or mem_efficient):
+            return None
+        return torch.backends.cuda.sdp_kernel(  # type: ignore
+            enable_flash=flash, enable_mem_efficient=mem_efficient, enable_math=False
+        )
+
+
+try:
+    import xformers.ops as xops  # type: ignore
+
+    _XFORMERS_AVAILABLE = True
+except ImportError:
+    _XFORMERS_AVAILABLE = False
+
+
+# Run float32 attention on Ampere+ GPUs in bfloat16 (the flash kernel still accumulates in float32). This halves the
+# memory traffic of the QK^T and PV matmuls and unlocks the flash kernel, at the cost of bfloat16's 8-bit mantissa on
+# the attention inputs and output. Disabled by default since outputs then no longer match float32 references.
+_CAST_ATTENTION_TO_BF16 = False
+
+# From this sequence length on, causal attention on GPU never falls back to the math kernel, which materializes the
+# full (sequence_length, sequence_length) mask and attention matrix. Unsupported inputs then fail loudly instead.
+_CAUSAL_FUSED_ONLY_MIN_SEQUENCE_LENGTH = 512
+
+
+@cache
+def _device_supports_flash_attention(device: Device) -> bool:
+    # PyTorch only ships flash attention kernels for Ampere (sm80) and newer GPUs
+    return torch.cuda.get_device_capability(device) >= (8, 0)
+
+
+def _use_xformers(device: Device) -> bool:
+    # Only when neither of PyTorch's fused kernels can run: mem-efficient attention also covers pre-Ampere GPUs.
+    return (
+        _XFORMERS_AVAILABLE
+        and device.type == "cuda"
+        and not torch.backends.cuda.mem_efficient_sdp_enabled()
+        and not (torch.backends.cuda.flash_sdp_enabled() and _device_supports_flash_attention(device))
+    )
+
+
+def _xformers_attention(
+    query: Float[Tensor, "batch num_heads source_sequence_length dim"],
+    key: Float[Tensor, "batch num_heads target_sequence_length dim"],
+    value: Float[Tensor, "batch num_heads target_sequence_length dim"],
+    is_causal: bool = False,
+) -> Float[Tensor, "batch num_heads source_sequence_length dim"]:
+    # xformers expects (batch, sequence_length, num_heads, dim) inputs
+    return xops.memory_efficient_attention(  # type: ignore
+        query.transpose(1, 2),
+        key.transpose(1, 2),
+        value.transpose(1, 2),
+        attn_bias=xops.LowerTriangularMask() if is_causal else None,  # type: ignore
+    ).transpose(1, 2)
 
 
 def scaled_dot_product_attention(
@@ -18,9 +99,66 @@ def scaled_dot_product_attention(
     value: Float[Tensor, "batch target_sequence_length dim"],
     is_causal: bool = False,
 ) -> Float[Tensor, "batch source_sequence_length dim"]:
+    if (
+        _CAST_ATTENTION_TO_BF16
+        and query.dtype == torch.float32
+        and query.is_cuda
+        and _device_supports_flash_attention(query.device)  # native bfloat16 also starts with Ampere
+    ):
+        bf16 = torch.bfloat16
+        output = scaled_dot_product_attention(query.to(bf16), key.to(bf16), value.to(bf16), is_causal=is_causal)
+        return output.to(query.dtype)
+    if _use_xformers(query.device):
+        return _xformers_attention(query, key, value, is_causal=is_causal)
+    if is_causal and query.is_cuda and query.shape[-2] >= _CAUSAL_FUSED_ONLY_MIN_SEQUENCE_LENGTH:
+        # only the fused backends the user has left enabled (none means the math kernel was explicitly chosen)
+        fused_kernels = _causal_sdpa_kernels()
+        if fused_kernels is not None:
+            with fused_kernels:
+                return _scaled_dot_product_attention(query, key, value, is_causal=True)  # type: ignore
     return _scaled_dot_product_attention(query, key, value, is_causal=is_causal)  # type: ignore
 
 
+def _split_to_multi_head(
+    x: Float[Tensor, "batch_size sequence_length embedding_dim"], num_heads: int, head_dim: int | None
+) -> Float[Tensor, "batch_size num_heads sequence_length head_dim"]:
+    return x.unflatten(-1, (num_heads, head_dim or -1)).transpose(1, 2)
+
+
+def _merge_multi_head(
+    x: Float[Tensor, "batch_size num_heads sequence_length head_dim"],
+) -> Float[Tensor, "batch_size sequence_length num_heads*head_dim"]:
+    batch_size, num_heads, sequence_length, head_dim = x.shape
+    return x.transpose(1, 2).contiguous().view(batch_size, sequence_length, num_heads * head_dim)
+
+
+def _multi_head_attention(
+    query: Float[Tensor, "batch num_queries embedding_dim"],
+    key: Float[Tensor, "batch num_keys embedding_dim"],
+    value: Float[Tensor, "batch num_values embedding_dim"],
+    num_heads: int,
+    head_dim: int | None,
+    is_causal: bool,
+    merge_heads: bool,
+) -> Tensor:
+    x = scaled_dot_product_attention(
+        _split_to_multi_head(query, num_heads, head_dim),
+        _split_to_multi_head(key, num_heads, head_dim),
+        _split_to_multi_head(value, num_heads, head_dim),
+        is_causal=is_causal,
+    )
+    return _merge_multi_head(x) if merge_heads else x
+
+
+# Opt-in. Sizes that vary between calls (resolutions, sequence lengths) get marked dynamic on recompilation.
+COMPILE_ATTENTION = os.getenv("REFINERS_COMPILE_ATTENTION") == "1"
+
+# One compiled function is shared by all attention layers, so they all use the same compilation cache.
+_compiled_multi_head_attention: Callable[..., Tensor] | None = (
+    torch.compile(_multi_head_attention) if COMPILE_ATTENTION else None  # type: ignore
+)
+
+
 def sparse_dot_product_attention_non_optimized(
     query: Float[Tensor, "batch source_sequence_length dim"],
     key: Float[Tensor, "batch target_sequence_length dim"],
@@ -44,9 +182,13 @@ class ScaledDotProductAttention(Module):
         is_causal: bool | None = None,
         is_optimized: bool = True,
         slice_size: int | None = None,
+        head_dim: int | None = None,
+        merge_heads: bool = True,
     ) -> None:
         super().__init__()
         self.num_heads = num_heads
+        self.head_dim = head_dim
+        self.merge_heads = merge_heads
         self.is_causal = is_causal
         self.is_optimized = is_optimized
         self.slice_size = slice_size
@@ -61,6 +203,17 @@ class ScaledDotProductAttention(Module):
         value: Float[Tensor, "batch num_values embedding_dim"],
         is_causal: bool | None = None,
     ) -> Float[Tensor, "batch num_queries dim"]:
+        if _compiled_multi_head_attention is not None and self.is_optimized and self.slice_size is None:
+            return _compiled_multi_head_attention(
+                query,
+                key,
+                value,
+                num_heads=self.num_heads,
+                head_dim=self.head_dim,
+                is_causal=self._resolve_is_causal(is_causal),
+                merge_heads=self.merge_heads,
+            )
+
         if self.slice_size is None:
             return self._process_attention(query, key, value, is_causal)
 
@@ -74,11 +227,16 @@ class ScaledDotProductAttention(Module):
         slice_size: int,
         is_causal: bool | None = None,
     ) -> Float[Tensor, "batch num_queries dim"]:
-        _, num_queries, _ = query.shape
-        output = torch.zeros_like(query)
+        batch_size, num_queries, embedding_dim = query.shape
+        output = (
+            torch.zeros_like(query)
+            if self.merge_heads
+            else query.new_zeros(batch_size, self.num_heads, num_queries, embedding_dim // self.num_heads)
+        )
         for start_idx in range(0, num_queries, slice_size):
             end_idx = min(start_idx + slice_size, num_queries)
-            output[:, start_idx:end_idx, :] = self._process_attention(
+            # the sequence dimension is second to last both with merged and unmerged heads
+            output[..., start_idx:end_idx, :] = self._process_attention(
                 query[:, start_idx:end_idx, :], key, value, is_causal
             )
         return output
@@ -90,16 +248,13 @@ class ScaledDotProductAttention(Module):
         value: Float[Tensor, "batch num_values embedding_dim"],
         is_causal: bool | None = None,
     ) -> Float[Tensor, "batch num_queries dim"]:
-        return self.merge_multi_head(
-            x=self.dot_product(
-                query=self.split_to_multi_head(query),
-                key=self.split_to_multi_head(key),
-                value=self.split_to_multi_head(value),
-                is_causal=(
-                    is_causal if is_causal is not None else (self.is_causal if self.is_causal is not None else False)
-                ),
-            )
+        x = self.dot_product(
+            query=self.split_to_multi_head(query),
+            key=self.split_to_multi_head(key),
+            value=self.split_to_multi_head(value),
+            is_causal=self._resolve_is_causal(is_causal),
         )
+        return self.merge_multi_head(x=x) if self.merge_heads else x
 
     def split_to_multi_head(
         self, x: Float[Tensor, "batch_size sequence_length embedding_dim"]
@@ -110,15 +265,198 @@ class ScaledDotProductAttention(Module):
         assert (
             x.shape[-1] % self.num_heads == 0
         ), f"Embedding dim (x.shape[-1]={x.shape[-1]}) must be divisible by num heads"
-        return x.reshape(x.shape[0], x.shape[1], self.num_heads, x.shape[-1] // self.num_heads).transpose(1, 2)
+        return _split_to_multi_head(x, self.num_heads, self.head_dim)
 
     def merge_multi_head(
         self, x: Float[Tensor, "batch_size num_heads sequence_length heads_dim"]
     ) -> Float[Tensor, "batch_size sequence_length heads_dim * num_heads"]:
-        return x.transpose(1, 2).reshape(x.shape[0], x.shape[2], self.num_heads * x.shape[-1])
+        return _merge_multi_head(x)
+
+    def _resolve_is_causal(self, is_causal: bool | None) -> bool:
+        return is_causal if is_causal is not None else (self.is_causal if self.is_causal is not None else False)
+
+
+class FusedScaledDotProductAttention(ScaledDotProductAttention):
+    """Scaled dot product attention over packed queries, keys and values (see `FusedQKVProjection`).
+
+    The packed tensor is split into heads with a single view and permute instead of one reshape and transpose per
+    input.
+    """
+
+    def forward(  # type: ignore[override]
+        self,
+        qkv: Float[Tensor, "batch sequence_length 3*embedding_dim"],
+        is_causal: bool | None = None,
+    ) -> Float[Tensor, "batch sequence_length embedding_dim"]:
+        if self.slice_size is not None or (_compiled_multi_head_attention is not None and self.is_optimized):
+            query, key, value = qkv.chunk(3, dim=-1)
+            return super().forward(query, key, value, is_causal=is_causal)
+
+        query, key, value = self.split_packed_to_multi_head(qkv, chunks=3)
+        x = self.dot_product(
+            query=query,
+            key=key,
+            value=value,
+            is_causal=self._resolve_is_causal(is_causal),
+        )
+        return self.merge_multi_head(x=x) if self.merge_heads else x
+
+    def split_packed_to_multi_head(
+        self, x: Float[Tensor, "batch_size sequence_length chunks*embedding_dim"], chunks: int
+    ) -> tuple[Tensor, ...]:
+        batch_size, sequence_length, _ = x.shape
+        x = x.view(batch_size, sequence_length, chunks, self.num_heads, self.head_dim or -1)
+        x = x.permute(2, 0, 3, 1, 4).contiguous()
+        return x.unbind(0)
+
+
+class FusedQKVProjection(Linear):
+    """Project a single input into queries, keys and values packed for `FusedScaledDotProductAttention`.
+
+    Equivalent to three `Linear` layers whose weights are concatenated along the output dimension.
+    """
+
+    unfused_groups = ((1, 2, 3),)
+
+    def __init__(
+        self,
+        in_features: int,
+        out_features: int,
+        bias: bool = True,
+        device: Device | str | None = None,
+        dtype: DType | None = None,
+    ) -> None:
+        super().__init__(
+            in_features=in_features,
+            out_features=3 * out_features,
+            bias=bias,
+            device=device,
+            dtype=dtype,
+        )
+
+
+class FusedKVProjection(Chain):
+    """Project queries on their own and keys and values with one matmul.
+
+    Meant for cross-attention where keys and values are computed from the same context tensor.
+    """
+
+    unfused_groups = ((1,), (2, 3))
+
+    def __init__(
+        self,
+        query_features: int,
+        key_value_features: int,
+        out_features: int,
+        bias: bool = True,
+        device: Device | str | None = None,
+        dtype: DType | None = None,
+    ) -> None:
+        self.query_features = query_features
+        self.key_value_features = key_value_features
+        self.out_features = out_features
+        super().__init__(
+            Linear(
+                in_features=query_features,
+                out_features=out_features,
+                bias=bias,
+                device=device,
+                dtype=dtype,
+            ),
+            Linear(
+                in_features=key_value_features,
+                out_features=2 * out_features,
+                bias=bias,
+                device=device,
+                dtype=dtype,
+            ),
+        )
+
+    def forward(  # type: ignore[override]
+        self,
+        query: Float[Tensor, "batch num_queries query_features"],
+        key: Float[Tensor, "batch num_keys key_value_features"],
+        value: Float[Tensor, "batch num_values key_value_features"],
+    ) -> tuple[Tensor, Tensor, Tensor]:
+        query_projection, key_value_projection = self
+        assert isinstance(key_value_projection, Linear)
+        if key is value:
+            key, value = key_value_projection(key).chunk(2, dim=-1)
+        else:
+            weight, bias, out = key_value_projection.weight, key_value_projection.bias, self.out_features
+            key = linear(key, weight[:out], bias[:out] if bias is not None else None)
+            value = linear(value, weight[out:], bias[out:] if bias is not None else None)
+        return query_projection(query), key, value
+
+
+class HeadFusedOutputProjection(WeightedModule):
+    """Output projection applied directly to unmerged attention heads.
+
+    Equivalent to `merge_multi_head` followed by `Linear(num_heads * head_dim, out_features)`, with the weight stored
+    as (num_heads, head_dim, out_features) so that both steps happen in a single einsum.
+    """
+
+    def __init__(
+        self,
+        num_heads: int,
+        head_dim: int,
+        out_features: int,
+        bias: bool = True,
+        device: Device | str | None = None,
+        dtype: DType | None = None,
+    ) -> None:
+        super().__init__()
+        self.num_heads = num_heads
+        self.head_dim = head_dim
+        self.out_features = out_features
+        # same initialization as `torch.nn.Linear`
+        bound = 1 / math.sqrt(num_heads * head_dim)
+        self.weight = TorchParameter(
+            torch.empty(num_heads, head_dim, out_features, device=device, dtype=dtype).uniform_(-bound, bound)
+        )
+        self.bias = (
+            TorchParameter(torch.empty(out_features, device=device, dtype=dtype).uniform_(-bound, bound))
+            if bias
+            else None
+        )
+        self._register_load_state_dict_pre_hook(self._load_linear_state_dict)  # type: ignore
+
+    def _load_linear_state_dict(self, state_dict: dict[str, Tensor], prefix: str, *args: Any) -> None:
+        """Reshape `Linear` weights of shape (out_features, num_heads * head_dim) on load."""
+        weight = state_dict.get(f"{prefix}weight")
+        if weight is not None and weight.dim() == 2:
+            state_dict[f"{prefix}weight"] = weight.t().reshape(self.num_heads, self.head_dim, self.out_features)
+
+    def forward(
+        self, x: Float[Tensor, "batch num_heads sequence_length head_dim"]
+    ) -> Float[Tensor, "batch sequence_length out_features"]:
+        x = torch.einsum("bhsd,hdo->bso", x, self.weight)
+        return x if self.bias is None else x + self.bias
+
+
+class UnfusedStateDictLoader:
+    """Mixin for `Chain`s with a fused layout that load checkpoints of their unfused counterpart.
 
+    Subclasses set `use_fused_projection`, implement `_load_unfused_state_dict` and call
+    `_register_unfused_state_dict_hook` at the end of `__init__`.
+    """
 
-class Attention(Chain):
+    use_fused_projection: bool
+
+    def _register_unfused_state_dict_hook(self) -> None:
+        assert isinstance(self, Chain)
+        if self.use_fused_projection:
+            self._register_load_state_dict_pre_hook(self._load_unfused_state_dict)  # type: ignore
+
+    def _post_structural_copy(self, source: Any) -> None:
+        # `structural_copy` does not carry hooks over
+        self._register_unfused_state_dict_hook()
+
+    def _load_unfused_state_dict(self, state_dict: dict[str, Tensor], prefix: str, *args: Any) -> None:
+        raise NotImplementedError
+
+
+class Attention(Chain, UnfusedStateDictLoader):
     def __init__(
         self,
         embedding_dim: int,
@@ -129,6 +467,7 @@ class Attention(Chain):
         use_bias: bool = True,
         is_causal: bool | None = None,
         is_optimized: bool = True,
+        use_fused_projection: bool = False,
         device: Device | str | None = None,
         dtype: DType | None = None,
     ) -> None:
@@ -144,32 +483,30 @@ class Attention(Chain):
         self.use_bias = use_bias
         self.is_causal = is_causal
         self.is_optimized = is_optimized
+        self.use_fused_projection = use_fused_projection
+        projection = self._build_projection(device=device, dtype=dtype)
+        attention_type = (
+            FusedScaledDotProductAttention if isinstance(projection, FusedQKVProjection) else ScaledDotProductAttention
+        )
         super().__init__(
-            Distribute(
-                Linear(
-                    in_features=self.embedding_dim,
-                    out_features=self.inner_dim,
-                    bias=self.use_bias,
-                    device=device,
-                    dtype=dtype,
-                ),
-                Linear(
-                    in_features=self.key_embedding_dim,
-                    out_features=self.inner_dim,
-                    bias=self.use_bias,
-                    device=device,
-                    dtype=dtype,
-                ),
-                Linear(
-                    in_features=self.value_embedding_dim,
-                    out_features=self.inner_dim,
-                    bias=self.use_bias,
-                    device=device,
-                    dtype=dtype,
-                ),
+            projection,
+            attention_type(
+                num_heads=num_heads,
+                is_causal=is_causal,
+                is_optimized=is_optimized,
+                head_dim=self.inner_dim // num_heads,
+                merge_heads=not self.use_fused_projection,
             ),
-            ScaledDotProductAttention(num_heads=num_heads, is_causal=is_causal, is_optimized=is_optimized),
-            Linear(
+            HeadFusedOutputProjection(
+                num_heads=num_heads,
+                head_dim=self.inner_dim // num_heads,
+                out_features=self.embedding_dim,
+                bias=True,
+                device=device,
+                dtype=dtype,
+            )
+            if self.use_fused_projection
+            else Linear(
                 in_features=self.inner_dim,
                 out_features=self.embedding_dim,
                 bias=True,
@@ -177,6 +514,79 @@ class Attention(Chain):
                 dtype=dtype,
             ),
         )
+        self._register_unfused_state_dict_hook()
+
+    def _build_projection(self, device: Device | str | None, dtype: DType | None) -> Module:
+        if self.use_fused_projection and self.key_embedding_dim == self.value_embedding_dim:
+            return FusedKVProjection(
+                query_features=self.embedding_dim,
+                key_value_features=self.key_embedding_dim,
+                out_features=self.inner_dim,
+                bias=self.use_bias,
+                device=device,
+                dtype=dtype,
+            )
+        return Distribute(
+            Linear(
+                in_features=self.embedding_dim,
+                out_features=self.inner_dim,
+                bias=self.use_bias,
+                device=device,
+                dtype=dtype,
+            ),
+            Linear(
+                in_features=self.key_embedding_dim,
+                out_features=self.inner_dim,
+                bias=self.use_bias,
+                device=device,
+                dtype=dtype,
+            ),
+            Linear(
+                in_features=self.value_embedding_dim,
+                out_features=self.inner_dim,
+                bias=self.use_bias,
+                device=device,
+                dtype=dtype,
+            ),
+        )
+
+    def _load_unfused_state_dict(self, state_dict: dict[str, Tensor], prefix: str, *args: Any) -> None:
+        """Remap unfused checkpoints (`Distribute` and output `Linear`) so they load into the fused layers."""
+        for parameter in ("weight", "bias"):
+            if f"{prefix}Linear.{parameter}" in state_dict:
+                state_dict[f"{prefix}HeadFusedOutputProjection.{parameter}"] = state_dict.pop(
+                    f"{prefix}Linear.{parameter}"
+                )
+
+        unfused_prefix = f"{prefix}Distribute."
+        if f"{unfused_prefix}Linear_1.weight" not in state_dict:
+            return
+        # not necessarily the first child (e.g. `SelfAttention2d` starts with a `Lambda`), nor a direct one
+        projection_name, projection = next(
+            (
+                (name, module)
+                for name, module in self.named_modules()
+                if isinstance(module, FusedQKVProjection | FusedKVProjection)
+            ),
+            (None, None),
+        )
+        if projection is None:
+            return
+        linear_prefixes = (
+            [f"{prefix}{projection_name}."]
+            if isinstance(projection, Linear)
+            else [
+                f"{prefix}{projection_name}.{name}."
+                for name, module in projection.named_children()
+                if isinstance(module, Linear)
+            ]
+        )
+        for linear_prefix, group in zip(linear_prefixes, projection.unfused_groups):
+            for parameter in ("weight", "bias"):
+                keys = [f"{unfused_prefix}Linear_{index}.{parameter}" for index in group]
+                if keys[0] not in state_dict:
+                    continue
+                state_dict[f"{linear_prefix}{parameter}"] = torch.cat([state_dict.pop(key) for key in keys])
 
 
 class SelfAttention(Attention):
@@ -188,6 +598,7 @@ class SelfAttention(Attention):
         use_bias: bool = True,
         is_causal: bool | None = None,
         is_optimized: bool = True,
+        use_fused_projection: bool = False,
         device: Device | str | None = None,
         dtype: DType | None = None,
     ) -> None:
@@ -198,10 +609,23 @@ class SelfAttention(Attention):
             use_bias=use_bias,
             is_causal=is_causal,
             is_optimized=is_optimized,
+            use_fused_projection=use_fused_projection,
             device=device,
             dtype=dtype,
         )
-        self.insert(0, Parallel(Identity(), Identity(), Identity()))
+        if not self.use_fused_projection:
+            self.insert(0, Parallel(Identity(), Identity(), Identity()))
+
+    def _build_projection(self, device: Device | str | None, dtype: DType | None) -> Module:
+        if self.use_fused_projection:
+            return FusedQKVProjection(
+                in_features=self.embedding_dim,
+                out_features=self.inner_dim,
+                bias=self.use_bias,
+                device=device,
+                dtype=dtype,
+            )
+        return super()._build_projection(device=device, dtype=dtype)
 
 
 class SelfAttention2d(SelfAttention):
@@ -212,35 +636,49 @@ class SelfAttention2d(SelfAttention):
         use_bias: bool = True,
         is_causal: bool | None = None,
         is_optimized: bool = True,
+        use_fused_projection: bool = False,
         device: Device | str | None = None,
         dtype: DType | None = None,
     ) -> None:
         assert channels % num_heads == 0, f"channels {channels} must be divisible by num_heads {num_heads}"
         self.channels = channels
+        self._hw: tuple[int, int] | None = None
         super().__init__(
             embedding_dim=channels,
             num_heads=num_heads,
             use_bias=use_bias,
             is_causal=is_causal,
             is_optimized=is_optimized,
+            use_fused_projection=use_fused_projection,
             device=device,
             dtype=dtype,
         )
         self.insert(0, Lambda(self.tensor_2d_to_sequence))
         self.append(Lambda(self.sequence_to_tensor_2d))
 
-    def init_context(self) -> Contexts:
-        return {"reshape": {"height": None, "width": None}}
+    def forward(  # type: ignore[override]
+        self, x: Float[Tensor, "batch channels height width"]
+    ) -> Float[Tensor, "batch channels height width"]:
+        """Run self-attention over the spatial positions of `x`.
+
+        The output is in channels-last memory format, whatever the format of `x`.
+        """
+        # For an NCHW input this is a full copy, but the same one the conversion to a sequence would make anyway. In
+        # exchange, the conversion back from a sequence is a view instead of a second copy.
+        return super().forward(x.contiguous(memory_format=torch.channels_last))
 
     def tensor_2d_to_sequence(
         self, x: Float[Tensor, "batch channels height width"]
     ) -> Float[Tensor, "batch height*width channels"]:
         height, width = x.shape[-2:]
-        self.set_context(context="reshape", value={"height": height, "width": width})
-        return x.reshape(x.shape[0], x.shape[1], height * width).transpose(1, 2)
+        self._hw = (height, width)
+        # a view for channels-last inputs, a copy otherwise
+        return x.permute(0, 2, 3, 1).reshape(x.shape[0], height * width, x.shape[1])
 
     def sequence_to_tensor_2d(
         self, x: Float[Tensor, "batch sequence_length channels"]
     ) -> Float[Tensor, "batch channels height width"]:
-        height, width = self.use_context("reshape").values()
-        return x.transpose(1, 2).reshape(x.shape[0], x.shape[2], height, width)
+        assert self._hw is not None, "tensor_2d_to_sequence must be called first"
+        height, width = self._hw
+        # channels-last output, no copy as long as the sequence is contiguous
+        return x.reshape(x.shape[0], height, width, x.shape[2]).permute(0, 3, 1, 2)
@@ -1,4 +1,10 @@
+from collections import deque
+from typing import Any
+
+import torch
+from jaxtyping import Float
 from torch import Size, Tensor, device as Device, dtype as DType
+from torch.nn.functional import layer_norm, linear
 
 from refiners.fluxion.context import Contexts
 from refiners.fluxion.layers import (
@@ -13,16 +19,65 @@ from refiners.fluxion.layers import (
     LayerNorm,
     Linear,
     Parallel,
+    Permute,
     Residual,
     SelfAttention,
     SetContext,
-    Transpose,
     Unflatten,
     UseContext,
 )
+from refiners.fluxion.layers.attentions import (
+    COMPILE_ATTENTION,
+    FusedQKVProjection,
+    UnfusedStateDictLoader,
+)
+
+
+def _layer_norm_linear(
+    x: Tensor, norm_weight: Tensor, norm_bias: Tensor, eps: float, weight: Tensor, bias: Tensor | None
+) -> Tensor:
+    return linear(layer_norm(x, x.shape[-1:], norm_weight, norm_bias, eps), weight, bias)
+
+
+# lets Inductor fuse the normalization into the projection
+_layer_norm_linear_kernel = (
+    torch.compile(_layer_norm_linear) if COMPILE_ATTENTION else _layer_norm_linear  # type: ignore
+)
+
+
+class LayerNormFusedQKVProjection(Chain):
+    """A `LayerNorm` followed by a `FusedQKVProjection`, run as a single function.
+
+    With `REFINERS_COMPILE_ATTENTION=1` this function is compiled so that the normalized activations never make a
+    round trip to memory. If the projection gets replaced (e.g. by a LoRA adapter), this falls back to running the
+    layers one after the other.
+    """
+
+    def __init__(self, norm: LayerNorm, projection: FusedQKVProjection) -> None:
+        super().__init__(norm, projection)
+
+    def forward(  # type: ignore[override]
+        self, x: Float[Tensor, "batch sequence_length embedding_dim"]
+    ) -> Float[Tensor, "batch sequence_length 3*embedding_dim"]:
+        norm, projection = self
+        if not (isinstance(norm, LayerNorm) and isinstance(projection, FusedQKVProjection)):
+            return super().forward(x)
+        return _layer_norm_linear_kernel(x, norm.weight, norm.bias, norm.eps, projection.weight, projection.bias)
+
+
+class UseCrossAttentionContext(UseContext):
+    """Pass the input through as queries, along with a context entry as both keys and values.
+
+    Equivalent to `Parallel(Identity(), UseContext(...), UseContext(...))` but looks the context up only once. Keys and
+    values are the very same tensor, so a fused `Attention` projects them with a single matmul.
+    """
+
+    def __call__(self, x: Tensor) -> tuple[Tensor, Tensor, Tensor]:  # type: ignore[override]
+        context = super().__call__(x)
+        return x, context, context
 
 
-class CrossAttentionBlock(Chain):
+class CrossAttentionBlock(Chain, UnfusedStateDictLoader):
     def __init__(
         self,
         embedding_dim: int,
@@ -30,6 +85,7 @@ class CrossAttentionBlock(Chain):
         context_key: str,
         num_heads: int = 1,
         use_bias: bool = True,
+        use_fused_projection: bool = False,
         device: Device | str | None = None,
         dtype: DType | None = None,
     ) -> None:
@@ -39,27 +95,33 @@ class CrossAttentionBlock(Chain):
         self.context_key = context_key
         self.num_heads = num_heads
         self.use_bias = use_bias
+        self.use_fused_projection = use_fused_projection
+
+        self_attention = SelfAttention(
+            embedding_dim=embedding_dim,
+            num_heads=num_heads,
+            use_bias=use_bias,
+            use_fused_projection=use_fused_projection,
+            device=device,
+            dtype=dtype,
+        )
+        norm = LayerNorm(normalized_shape=embedding_dim, device=device, dtype=dtype)
+        if use_fused_projection:
+            projection = self_attention.ensure_find(FusedQKVProjection)
+            self_attention.replace(old_module=projection, new_module=LayerNormFusedQKVProjection(norm, projection))
 
         super().__init__(
+            Residual(self_attention) if use_fused_projection else Residual(norm, self_attention),
             Residual(
                 LayerNorm(normalized_shape=embedding_dim, device=device, dtype=dtype),
-                SelfAttention(
-                    embedding_dim=embedding_dim, num_heads=num_heads, use_bias=use_bias, device=device, dtype=dtype
-                ),
-            ),
-            Residual(
-                LayerNorm(normalized_shape=embedding_dim, device=device, dtype=dtype),
-                Parallel(
-                    Identity(),
-                    UseContext(context=self.context, key=context_key),
-                    UseContext(context=self.context, key=context_key),
-                ),
+                UseCrossAttentionContext(context=self.context, key=context_key),
                 Attention(
                     embedding_dim=embedding_dim,
                     num_heads=num_heads,
                     key_embedding_dim=context_embedding_dim,
                     value_embedding_dim=context_embedding_dim,
                     use_bias=use_bias,
+                    use_fused_projection=use_fused_projection,
                     device=device,
                     dtype=dtype,
                 ),
@@ -71,22 +133,40 @@ class CrossAttentionBlock(Chain):
                 Linear(in_features=4 * embedding_dim, out_features=embedding_dim, device=device, dtype=dtype),
             ),
         )
+        self._register_unfused_state_dict_hook()
+
+    def _load_unfused_state_dict(self, state_dict: dict[str, Tensor], prefix: str, *args: Any) -> None:
+        """Move the self-attention `LayerNorm` of unfused checkpoints into `LayerNormFusedQKVProjection`.
+
+        The `SelfAttention` remaps its own projections.
+        """
+        for parameter in ("weight", "bias"):
+            key = f"{prefix}Residual_1.LayerNorm.{parameter}"
+            if key in state_dict:
+                fused_key = f"{prefix}Residual_1.SelfAttention.LayerNormFusedQKVProjection.LayerNorm.{parameter}"
+                state_dict[fused_key] = state_dict.pop(key)
 
 
 class StatefulFlatten(Chain):
     def __init__(self, context: str, key: str, start_dim: int = 0, end_dim: int = -1) -> None:
         self.start_dim = start_dim
         self.end_dim = end_dim
+        # resolved once here, or once per input rank when `end_dim` counts from the end
+        self._slice = slice(start_dim, end_dim + 1) if end_dim >= 0 else None
+        self._slice_by_ndim: dict[int, slice] = {}
 
         super().__init__(
             SetContext(context=context, key=key, callback=self.push),
             Flatten(start_dim=start_dim, end_dim=end_dim),
         )
 
-    def push(self, sizes: list[Size], x: Tensor) -> None:
-        sizes.append(
-            x.shape[slice(self.start_dim, self.end_dim + 1 if self.end_dim >= 0 else x.ndim + self.end_dim + 1)]
-        )
+    def push(self, sizes: deque[Size], x: Tensor) -> None:
+        dims = self._slice
+        if dims is None:
+            dims = self._slice_by_ndim.get(x.ndim)
+            if dims is None:
+                dims = self._slice_by_ndim[x.ndim] = slice(self.start_dim, x.ndim + self.end_dim + 1)
+        sizes.append(x.shape[dims])
 
 
 class CrossAttentionBlock2d(Residual):
@@ -100,6 +180,7 @@ class CrossAttentionBlock2d(Residual):
         num_groups: int = 32,
         use_bias: bool = True,
         use_linear_projection: bool = False,
+        use_fused_projection: bool = False,
         device: Device | str | None = None,
         dtype: DType | None = None,
     ) -> None:
@@ -114,42 +195,43 @@ class CrossAttentionBlock2d(Residual):
         self.use_bias = use_bias
         self.context_key = context_key
         self.use_linear_projection = use_linear_projection
+        self.use_fused_projection = use_fused_projection
         self.projection_type = "Linear" if use_linear_projection else "Conv2d"
 
         in_block = (
             Chain(
                 GroupNorm(channels=channels, num_groups=num_groups, eps=1e-6, device=device, dtype=dtype),
-                StatefulFlatten(context="flatten", key="sizes", start_dim=2),
-                Transpose(1, 2),
+                Permute(0, 2, 3, 1),
+                StatefulFlatten(context="flatten", key="sizes", start_dim=1, end_dim=2),
                 Linear(in_features=channels, out_features=channels, device=device, dtype=dtype),
             )
             if use_linear_projection
             else Chain(
                 GroupNorm(channels=channels, num_groups=num_groups, eps=1e-6, device=device, dtype=dtype),
                 Conv2d(in_channels=channels, out_channels=channels, kernel_size=1, device=device, dtype=dtype),
-                StatefulFlatten(context="flatten", key="sizes", start_dim=2),
-                Transpose(1, 2),
+                Permute(0, 2, 3, 1),
+                StatefulFlatten(context="flatten", key="sizes", start_dim=1, end_dim=2),
             )
         )
 
         out_block = (
             Chain(
                 Linear(in_features=channels, out_features=channels, device=device, dtype=dtype),
-                Transpose(1, 2),
                 Parallel(
                     Identity(),
                     UseContext(context="flatten", key="sizes").compose(lambda x: x.pop()),
                 ),
-                Unflatten(dim=2),
+                Unflatten(dim=1),
+                Permute(0, 3, 1, 2),
             )
             if use_linear_projection
             else Chain(
-                Transpose(1, 2),
                 Parallel(
                     Identity(),
                     UseContext(context="flatten", key="sizes").compose(lambda x: x.pop()),
                 ),
-                Unflatten(dim=2),
+                Unflatten(dim=1),
+                Permute(0, 3, 1, 2),
                 Conv2d(in_channels=channels, out_channels=channels, kernel_size=1, device=device, dtype=dtype),
             )
         )
@@ -157,19 +239,27 @@ class CrossAttentionBlock2d(Residual):
         super().__init__(
             in_block,
             Chain(
-                CrossAttentionBlock(
-                    embedding_dim=channels,
-                    context_embedding_dim=context_embedding_dim,
-                    context_key=context_key,
-                    num_heads=num_attention_heads,
-                    use_bias=use_bias,
-                    device=device,
-                    dtype=dtype,
-                )
-                for _ in range(num_attention_layers)
+                *[
+                    CrossAttentionBlock(
+                        embedding_dim=channels,
+                        context_embedding_dim=context_embedding_dim,
+                        context_key=context_key,
+                        num_heads=num_attention_heads,
+                        use_bias=use_bias,
+                        use_fused_projection=use_fused_projection,
+                        device=device,
+                        dtype=dtype,
+                    )
+                    for _ in range(num_attention_layers)
+                ]
             ),
             out_block,
         )
 
     def init_context(self) -> Contexts:
-        return {"flatten": {"sizes": []}}
+        # Reuse a single buffer across forward passes (pushes and pops are balanced within a pass). Structural copies
+        # do not copy private attributes, hence the lazy creation.
+        if not hasattr(self, "_sizes"):
+            self._sizes = deque[Size]()
+        self._sizes.clear()
+        return {"flatten": {"sizes": self._sizes}}
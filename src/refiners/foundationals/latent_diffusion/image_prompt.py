@@ -253,6 +253,10 @@ class CrossAttentionAdapter(fl.Chain, Adapter[fl.Attention]):
         image_sequence_length: int = 4,
         scale: float = 1.0,
     ) -> None:
+        if target.use_fused_projection:
+            raise ValueError(
+                "IP-Adapter needs the unfused attention layout, build the UNet with use_fused_projection=False."
+            )
         self.text_sequence_length = text_sequence_length
         self.image_sequence_length = image_sequence_length
         self.scale = scale
@@ -91,6 +91,8 @@ class SD1LoraAdapter(fl.Chain, Adapter[StableDiffusion_1]):
         scale: float = 1.0,
         weights: dict[str, Tensor] | None = None,
     ):
+        if sub_targets.get("unet") and target.unet.use_fused_projection:
+            raise ValueError("LoRA needs the unfused attention layout, build the UNet with use_fused_projection=False.")
         with self.setup_adapter(target):
             super().__init__(target)
 
@@ -101,6 +101,11 @@ class ReferenceOnlyControlAdapter(Chain, Adapter[SD1UNet]):
     def __init__(self, target: SD1UNet, style_cfg: float = 0.5) -> None:
         # the style_cfg is the weight of the guide in unconditionned diffusion.
         # This value is recommended to be 0.5 on the sdwebui repo.
+        if target.use_fused_projection:
+            raise ValueError(
+                "Reference-only control needs the unfused attention layout, build the UNet with"
+                " use_fused_projection=False."
+            )
 
         self.sub_adapters: list[SelfAttentionInjectionAdapter] = []
         self._passthrough: list[SelfAttentionInjectionPassthrough] = [
@@ -61,6 +61,11 @@ class SelfAttentionShape(fl.Passthrough):
 
 class SAGAdapter(Generic[T], fl.Chain, Adapter[T]):
     def __init__(self, target: T, scale: float = 1.0, kernel_size: int = 9, sigma: float = 1.0) -> None:
+        if target.use_fused_projection:
+            raise ValueError(
+                "Self-attention guidance needs the unfused attention layout, build the UNet with"
+                " use_fused_projection=False."
+            )
         self.scale = scale
         self.kernel_size = kernel_size
         self.sigma = sigma
@@ -74,6 +74,7 @@ class CLIPLCrossAttention(CrossAttentionBlock2d):
     def __init__(
         self,
         channels: int,
+        use_fused_projection: bool = False,
         device: Device | str | None = None,
         dtype: DType | None = None,
     ) -> None:
@@ -83,6 +84,7 @@ class CLIPLCrossAttention(CrossAttentionBlock2d):
             context_key="clip_text_embedding",
             num_attention_heads=8,
             use_bias=False,
+            use_fused_projection=use_fused_projection,
             device=device,
             dtype=dtype,
         )
@@ -92,6 +94,7 @@ class DownBlocks(fl.Chain):
     def __init__(
         self,
         in_channels: int,
+        use_fused_projection: bool = False,
         device: Device | str | None = None,
         dtype: DType | None = None,
     ):
@@ -104,29 +107,41 @@ class DownBlocks(fl.Chain):
             ),
             fl.Chain(
                 ResidualBlock(in_channels=320, out_channels=320, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=320, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=320, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=320, out_channels=320, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=320, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=320, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(fl.Downsample(channels=320, scale_factor=2, padding=1, device=device, dtype=dtype)),
             fl.Chain(
                 ResidualBlock(in_channels=320, out_channels=640, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=640, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=640, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=640, out_channels=640, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=640, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=640, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(fl.Downsample(channels=640, scale_factor=2, padding=1, device=device, dtype=dtype)),
             fl.Chain(
                 ResidualBlock(in_channels=640, out_channels=1280, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=1280, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=1280, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=1280, out_channels=1280, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=1280, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=1280, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(fl.Downsample(channels=1280, scale_factor=2, padding=1, device=device, dtype=dtype)),
             fl.Chain(
@@ -141,6 +156,7 @@ class DownBlocks(fl.Chain):
 class UpBlocks(fl.Chain):
     def __init__(
         self,
+        use_fused_projection: bool = False,
         device: Device | str | None = None,
         dtype: DType | None = None,
     ) -> None:
@@ -157,50 +173,75 @@ class UpBlocks(fl.Chain):
             ),
             fl.Chain(
                 ResidualBlock(in_channels=2560, out_channels=1280, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=1280, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=1280, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=2560, out_channels=1280, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=1280, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=1280, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=1920, out_channels=1280, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=1280, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=1280, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
                 fl.Upsample(channels=1280, device=device, dtype=dtype),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=1920, out_channels=640, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=640, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=640, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=1280, out_channels=640, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=640, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=640, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=960, out_channels=640, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=640, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=640, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
                 fl.Upsample(channels=640, device=device, dtype=dtype),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=960, out_channels=320, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=320, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=320, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=640, out_channels=320, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=320, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=320, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=640, out_channels=320, device=device, dtype=dtype),
-                CLIPLCrossAttention(channels=320, device=device, dtype=dtype),
+                CLIPLCrossAttention(
+                    channels=320, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+                ),
             ),
         )
 
 
 class MiddleBlock(fl.Chain):
-    def __init__(self, device: Device | str | None = None, dtype: DType | None = None) -> None:
+    def __init__(
+        self,
+        use_fused_projection: bool = False,
+        device: Device | str | None = None,
+        dtype: DType | None = None,
+    ) -> None:
         super().__init__(
             ResidualBlock(in_channels=1280, out_channels=1280, device=device, dtype=dtype),
-            CLIPLCrossAttention(channels=1280, device=device, dtype=dtype),
+            CLIPLCrossAttention(
+                channels=1280, use_fused_projection=use_fused_projection, device=device, dtype=dtype
+            ),
             ResidualBlock(in_channels=1280, out_channels=1280, device=device, dtype=dtype),
         )
 
@@ -234,16 +275,30 @@ class ResidualConcatenator(fl.Chain):
 
 
 class SD1UNet(fl.Chain):
-    def __init__(self, in_channels: int, device: Device | str | None = None, dtype: DType | None = None) -> None:
+    """Stable Diffusion 1.x UNet.
+
+    With `use_fused_projection=True`, attention layers project queries, keys and values with fused matmuls (unfused
+    checkpoints still load). LoRA, IP-Adapter, reference-only control and self-attention guidance rely on the unfused
+    layout and refuse such UNets.
+    """
+
+    def __init__(
+        self,
+        in_channels: int,
+        use_fused_projection: bool = False,
+        device: Device | str | None = None,
+        dtype: DType | None = None,
+    ) -> None:
         self.in_channels = in_channels
+        self.use_fused_projection = use_fused_projection
         super().__init__(
             TimestepEncoder(device=device, dtype=dtype),
-            DownBlocks(in_channels=in_channels, device=device, dtype=dtype),
+            DownBlocks(in_channels=in_channels, use_fused_projection=use_fused_projection, device=device, dtype=dtype),
             fl.Sum(
                 fl.UseContext(context="unet", key="residuals").compose(lambda x: x[-1]),
-                MiddleBlock(device=device, dtype=dtype),
+                MiddleBlock(use_fused_projection=use_fused_projection, device=device, dtype=dtype),
             ),
-            UpBlocks(),
+            UpBlocks(use_fused_projection=use_fused_projection),
             fl.Chain(
                 fl.GroupNorm(channels=320, num_groups=32, device=device, dtype=dtype),
                 fl.SiLU(),
@@ -79,6 +79,7 @@ class SDXLCrossAttention(CrossAttentionBlock2d):
         channels: int,
         num_attention_layers: int = 1,
         num_attention_heads: int = 10,
+        use_fused_projection: bool = False,
         device: Device | str | None = None,
         dtype: DType | None = None,
     ) -> None:
@@ -90,13 +91,20 @@ class SDXLCrossAttention(CrossAttentionBlock2d):
             num_attention_heads=num_attention_heads,
             use_bias=False,
             use_linear_projection=True,
+            use_fused_projection=use_fused_projection,
             device=device,
             dtype=dtype,
         )
 
 
 class DownBlocks(fl.Chain):
-    def __init__(self, in_channels: int, device: Device | str | None = None, dtype: DType | None = None) -> None:
+    def __init__(
+        self,
+        in_channels: int,
+        use_fused_projection: bool = False,
+        device: Device | str | None = None,
+        dtype: DType | None = None,
+    ) -> None:
         self.in_channels = in_channels
 
         in_block = fl.Chain(
@@ -117,13 +125,23 @@ class DownBlocks(fl.Chain):
             fl.Chain(
                 ResidualBlock(in_channels=320, out_channels=640, device=device, dtype=dtype),
                 SDXLCrossAttention(
-                    channels=640, num_attention_layers=2, num_attention_heads=10, device=device, dtype=dtype
+                    channels=640,
+                    num_attention_layers=2,
+                    num_attention_heads=10,
+                    use_fused_projection=use_fused_projection,
+                    device=device,
+                    dtype=dtype,
                 ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=640, out_channels=640, device=device, dtype=dtype),
                 SDXLCrossAttention(
-                    channels=640, num_attention_layers=2, num_attention_heads=10, device=device, dtype=dtype
+                    channels=640,
+                    num_attention_layers=2,
+                    num_attention_heads=10,
+                    use_fused_projection=use_fused_projection,
+                    device=device,
+                    dtype=dtype,
                 ),
             ),
             fl.Chain(
@@ -134,13 +152,23 @@ class DownBlocks(fl.Chain):
             fl.Chain(
                 ResidualBlock(in_channels=640, out_channels=1280, device=device, dtype=dtype),
                 SDXLCrossAttention(
-                    channels=1280, num_attention_layers=10, num_attention_heads=20, device=device, dtype=dtype
+                    channels=1280,
+                    num_attention_layers=10,
+                    num_attention_heads=20,
+                    use_fused_projection=use_fused_projection,
+                    device=device,
+                    dtype=dtype,
                 ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=1280, out_channels=1280, device=device, dtype=dtype),
                 SDXLCrossAttention(
-                    channels=1280, num_attention_layers=10, num_attention_heads=20, device=device, dtype=dtype
+                    channels=1280,
+                    num_attention_layers=10,
+                    num_attention_heads=20,
+                    use_fused_projection=use_fused_projection,
+                    device=device,
+                    dtype=dtype,
                 ),
             ),
         ]
@@ -154,24 +182,44 @@ class DownBlocks(fl.Chain):
 
 
 class UpBlocks(fl.Chain):
-    def __init__(self, device: Device | str | None = None, dtype: DType | None = None) -> None:
+    def __init__(
+        self,
+        use_fused_projection: bool = False,
+        device: Device | str | None = None,
+        dtype: DType | None = None,
+    ) -> None:
         first_blocks = [
             fl.Chain(
                 ResidualBlock(in_channels=2560, out_channels=1280, device=device, dtype=dtype),
                 SDXLCrossAttention(
-                    channels=1280, num_attention_layers=10, num_attention_heads=20, device=device, dtype=dtype
+                    channels=1280,
+                    num_attention_layers=10,
+                    num_attention_heads=20,
+                    use_fused_projection=use_fused_projection,
+                    device=device,
+                    dtype=dtype,
                 ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=2560, out_channels=1280, device=device, dtype=dtype),
                 SDXLCrossAttention(
-                    channels=1280, num_attention_layers=10, num_attention_heads=20, device=device, dtype=dtype
+                    channels=1280,
+                    num_attention_layers=10,
+                    num_attention_heads=20,
+                    use_fused_projection=use_fused_projection,
+                    device=device,
+                    dtype=dtype,
                 ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=1920, out_channels=1280, device=device, dtype=dtype),
                 SDXLCrossAttention(
-                    channels=1280, num_attention_layers=10, num_attention_heads=20, device=device, dtype=dtype
+                    channels=1280,
+                    num_attention_layers=10,
+                    num_attention_heads=20,
+                    use_fused_projection=use_fused_projection,
+                    device=device,
+                    dtype=dtype,
                 ),
                 fl.Upsample(channels=1280, device=device, dtype=dtype),
             ),
@@ -181,19 +229,34 @@ class UpBlocks(fl.Chain):
             fl.Chain(
                 ResidualBlock(in_channels=1920, out_channels=640, device=device, dtype=dtype),
                 SDXLCrossAttention(
-                    channels=640, num_attention_layers=2, num_attention_heads=10, device=device, dtype=dtype
+                    channels=640,
+                    num_attention_layers=2,
+                    num_attention_heads=10,
+                    use_fused_projection=use_fused_projection,
+                    device=device,
+                    dtype=dtype,
                 ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=1280, out_channels=640, device=device, dtype=dtype),
                 SDXLCrossAttention(
-                    channels=640, num_attention_layers=2, num_attention_heads=10, device=device, dtype=dtype
+                    channels=640,
+                    num_attention_layers=2,
+                    num_attention_heads=10,
+                    use_fused_projection=use_fused_projection,
+                    device=device,
+                    dtype=dtype,
                 ),
             ),
             fl.Chain(
                 ResidualBlock(in_channels=960, out_channels=640, device=device, dtype=dtype),
                 SDXLCrossAttention(
-                    channels=640, num_attention_layers=2, num_attention_heads=10, device=device, dtype=dtype
+                    channels=640,
+                    num_attention_layers=2,
+                    num_attention_heads=10,
+                    use_fused_projection=use_fused_projection,
+                    device=device,
+                    dtype=dtype,
                 ),
                 fl.Upsample(channels=640, device=device, dtype=dtype),
             ),
@@ -219,11 +282,21 @@ class UpBlocks(fl.Chain):
 
 
 class MiddleBlock(fl.Chain):
-    def __init__(self, device: Device | str | None = None, dtype: DType | None = None) -> None:
+    def __init__(
+        self,
+        use_fused_projection: bool = False,
+        device: Device | str | None = None,
+        dtype: DType | None = None,
+    ) -> None:
         super().__init__(
             ResidualBlock(in_channels=1280, out_channels=1280, device=device, dtype=dtype),
             SDXLCrossAttention(
-                channels=1280, num_attention_layers=10, num_attention_heads=20, device=device, dtype=dtype
+                channels=1280,
+                num_attention_layers=10,
+                num_attention_heads=20,
+                use_fused_projection=use_fused_projection,
+                device=device,
+                dtype=dtype,
             ),
             ResidualBlock(in_channels=1280, out_channels=1280, device=device, dtype=dtype),
         )
@@ -239,14 +312,28 @@ class OutputBlock(fl.Chain):
 
 
 class SDXLUNet(fl.Chain):
-    def __init__(self, in_channels: int, device: Device | str | None = None, dtype: DType | None = None) -> None:
+    """Stable Diffusion XL UNet.
+
+    With `use_fused_projection=True`, attention layers project queries, keys and values with fused matmuls (unfused
+    checkpoints still load). LoRA, IP-Adapter, reference-only control and self-attention guidance rely on the unfused
+    layout and refuse such UNets.
+    """
+
+    def __init__(
+        self,
+        in_channels: int,
+        use_fused_projection: bool = False,
+        device: Device | str | None = None,
+        dtype: DType | None = None,
+    ) -> None:
         self.in_channels = in_channels
+        self.use_fused_projection = use_fused_projection
         super().__init__(
             TimestepEncoder(device=device, dtype=dtype),
-            DownBlocks(in_channels=in_channels, device=device, dtype=dtype),
-            MiddleBlock(device=device, dtype=dtype),
+            DownBlocks(in_channels=in_channels, use_fused_projection=use_fused_projection, device=device, dtype=dtype),
+            MiddleBlock(use_fused_projection=use_fused_projection, device=device, dtype=dtype),
             fl.Residual(fl.UseContext(context="unet", key="residuals").compose(lambda x: x[-1])),
-            UpBlocks(device=device, dtype=dtype),
+            UpBlocks(use_fused_projection=use_fused_projection, device=device, dtype=dtype),
             OutputBlock(device=device, dtype=dtype),
         )
         for residual_block in self.layers(ResidualBlock):
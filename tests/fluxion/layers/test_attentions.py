@@ -0,0 +1,192 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Iterator
+from warnings import warn
+
+import pytest
+import torch
+from torch import Tensor
+
+import refiners.fluxion.layers as fl
+import refiners.fluxion.layers.attentions as attentions
+from refiners.fluxion.layers.attentions import FusedScaledDotProductAttention
+from refiners.fluxion.utils import no_grad
+
+
+def test_fused_self_attention_loads_unfused_weights() -> None:
+    attention = fl.SelfAttention(embedding_dim=64, num_heads=4)
+    fused_attention = fl.SelfAttention(embedding_dim=64, num_heads=4, use_fused_projection=True)
+    assert len(fused_attention) == 3
+    fused_attention.load_state_dict(attention.state_dict())
+    fused_attention.structural_copy().load_state_dict(attention.state_dict())
+
+    x = torch.randn(2, 10, 64)
+    with no_grad():
+        assert torch.allclose(fused_attention(x), attention(x), atol=1e-6)
+
+
+def test_fused_self_attention_sliced() -> None:
+    attention = fl.SelfAttention(embedding_dim=64, num_heads=4, use_fused_projection=True)
+    sliced_attention = fl.SelfAttention(embedding_dim=64, num_heads=4, use_fused_projection=True)
+    sliced_attention.load_state_dict(attention.state_dict())
+    sliced_attention.ensure_find(FusedScaledDotProductAttention).slice_size = 3
+
+    x = torch.randn(2, 10, 64)
+    with no_grad():
+        assert torch.allclose(sliced_attention(x), attention(x), atol=1e-6)
+
+
+def test_fused_self_attention_2d_loads_unfused_weights() -> None:
+    attention = fl.SelfAttention2d(channels=64, num_heads=4)
+    fused_attention = fl.SelfAttention2d(channels=64, num_heads=4, use_fused_projection=True)
+    fused_attention.load_state_dict(attention.state_dict())
+
+    x = torch.randn(2, 64, 8, 6)
+    with no_grad():
+        assert torch.allclose(fused_attention(x), attention(x), atol=1e-6)
+
+
+def test_fused_cross_attention_loads_unfused_weights() -> None:
+    attention = fl.Attention(embedding_dim=64, num_heads=4, key_embedding_dim=32, value_embedding_dim=32)
+    fused_attention = fl.Attention(
+        embedding_dim=64, num_heads=4, key_embedding_dim=32, value_embedding_dim=32, use_fused_projection=True
+    )
+    fused_attention.load_state_dict(attention.state_dict())
+
+    x = torch.randn(2, 10, 64)
+    context = torch.randn(2, 7, 32)
+    other_context = torch.randn(2, 7, 32)
+    with no_grad():
+        assert torch.allclose(fused_attention(x, context, context), attention(x, context, context), atol=1e-6)
+        assert torch.allclose(
+            fused_attention(x, context, other_context), attention(x, context, other_context), atol=1e-6
+        )
+
+
+def test_self_attention_2d_sequence_round_trip() -> None:
+    attention = fl.SelfAttention2d(channels=64, num_heads=4)
+    x = torch.randn(2, 64, 8, 6)
+
+    sequence = attention.tensor_2d_to_sequence(x)
+    assert torch.equal(sequence, x.flatten(2).transpose(1, 2))
+    assert torch.equal(attention.sequence_to_tensor_2d(sequence), x)
+
+
+def test_self_attention_2d_outputs_channels_last() -> None:
+    attention = fl.SelfAttention2d(channels=64, num_heads=4)
+    x = torch.randn(2, 64, 8, 6)
+
+    with no_grad():
+        y = attention(x)
+        assert y.shape == x.shape
+        assert y.is_contiguous(memory_format=torch.channels_last)
+        assert torch.allclose(attention(x.contiguous(memory_format=torch.channels_last)), y)
+
+
+@pytest.mark.parametrize(
+    "flash_enabled, mem_efficient_enabled, supports_flash, expected",
+    [
+        (True, True, True, False),
+        (False, True, True, False),  # mem-efficient attention runs whenever flash is disabled
+        (True, True, False, False),  # pre-Ampere GPUs still have mem-efficient attention
+        (True, False, True, False),
+        (True, False, False, True),
+        (False, False, True, True),
+    ],
+)
+def test_xformers_only_without_fused_sdpa_kernels(
+    monkeypatch: pytest.MonkeyPatch,
+    flash_enabled: bool,
+    mem_efficient_enabled: bool,
+    supports_flash: bool,
+    expected: bool,
+) -> None:
+    monkeypatch.setattr(attentions, "_XFORMERS_AVAILABLE", True)
+    monkeypatch.setattr(attentions, "_device_supports_flash_attention", lambda device: supports_flash)
+    monkeypatch.setattr(torch.backends.cuda, "flash_sdp_enabled", lambda: flash_enabled)
+    monkeypatch.setattr(torch.backends.cuda, "mem_efficient_sdp_enabled", lambda: mem_efficient_enabled)
+
+    assert attentions._use_xformers(torch.device("cuda")) == expected  # type: ignore[reportPrivateUsage]
+    assert not attentions._use_xformers(torch.device("cpu"))  # type: ignore[reportPrivateUsage]
+
+
+@pytest.mark.parametrize("is_causal", [False, True])
+def test_xformers_attention_matches_sdpa(monkeypatch: pytest.MonkeyPatch, is_causal: bool) -> None:
+    def memory_efficient_attention(query: Tensor, key: Tensor, value: Tensor, attn_bias: Any = None) -> Tensor:
+        # xformers takes (batch, sequence_length, num_heads, dim) inputs
+        assert query.shape == (2, 10, 4, 16)
+        output = torch.nn.functional.scaled_dot_product_attention(  # type: ignore
+            query.transpose(1, 2), key.transpose(1, 2), value.transpose(1, 2), is_causal=attn_bias is not None
+        )
+        return output.transpose(1, 2)  # type: ignore
+
+    xops = SimpleNamespace(memory_efficient_attention=memory_efficient_attention, LowerTriangularMask=object)
+    monkeypatch.setattr(attentions, "xops", xops, raising=False)
+    monkeypatch.setattr(attentions, "_use_xformers", lambda device: True)
+
+    query, key, value = torch.randn(3, 2, 4, 10, 16).unbind(0)
+    expected = torch.nn.functional.scaled_dot_product_attention(query, key, value, is_causal=is_causal)  # type: ignore
+    output = attentions.scaled_dot_product_attention(query, key, value, is_causal=is_causal)
+    assert torch.allclose(output, expected, atol=1e-6)
+
+
+def test_attention_cast_to_bf16(monkeypatch: pytest.MonkeyPatch, test_device: torch.device) -> None:
+    if test_device.type != "cuda":
+        warn("only running on CUDA, skipping")
+        pytest.skip()
+    if torch.cuda.get_device_capability(test_device) < (8, 0):
+        warn("only running on Ampere and newer GPUs, skipping")
+        pytest.skip()
+
+    dtypes: list[torch.dtype] = []
+
+    def sdpa(query: Tensor, key: Tensor, value: Tensor, is_causal: bool = False) -> Tensor:
+        dtypes.append(query.dtype)
+        return torch.nn.functional.scaled_dot_product_attention(query, key, value, is_causal=is_causal)  # type: ignore
+
+    monkeypatch.setattr(attentions, "_scaled_dot_product_attention", sdpa)
+    query, key, value = torch.randn(3, 2, 4, 64, 32, device=test_device).unbind(0)
+    expected = attentions.scaled_dot_product_attention(query, key, value)
+
+    monkeypatch.setattr(attentions, "_CAST_ATTENTION_TO_BF16", True)
+    output = attentions.scaled_dot_product_attention(query, key, value)
+
+    assert dtypes == [torch.float32, torch.bfloat16]
+    assert output.dtype == torch.float32
+    assert torch.allclose(output, expected, atol=2e-2)
+
+
+def test_causal_sdpa_kernels_respect_disabled_backends(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(torch.backends.cuda, "flash_sdp_enabled", lambda: False)
+    monkeypatch.setattr(torch.backends.cuda, "mem_efficient_sdp_enabled", lambda: False)
+    monkeypatch.setattr(torch.backends.cuda, "cudnn_sdp_enabled", lambda: False, raising=False)
+    assert attentions._causal_sdpa_kernels() is None  # type: ignore[reportPrivateUsage]
+
+
+def test_long_causal_attention_uses_fused_kernels(monkeypatch: pytest.MonkeyPatch, test_device: torch.device) -> None:
+    if test_device.type != "cuda":
+        warn("only running on CUDA, skipping")
+        pytest.skip()
+
+    entered: list[bool] = []
+
+    @contextmanager
+    def fused_kernels() -> Iterator[None]:
+        entered.append(True)
+        yield
+
+    monkeypatch.setattr(attentions, "_causal_sdpa_kernels", fused_kernels)
+    min_length = attentions._CAUSAL_FUSED_ONLY_MIN_SEQUENCE_LENGTH  # type: ignore[reportPrivateUsage]
+    for sequence_length, is_causal, expected in [
+        (min_length, True, [True]),
+        (min_length - 1, True, []),
+        (min_length, False, []),
+    ]:
+        entered.clear()
+        query, key, value = torch.randn(3, 1, 2, sequence_length, 32, device=test_device).unbind(0)
+        output = attentions.scaled_dot_product_attention(query, key, value, is_causal=is_causal)
+        reference = torch.nn.functional.scaled_dot_product_attention(  # type: ignore
+            query, key, value, is_causal=is_causal
+        )
+        assert entered == expected
+        assert torch.allclose(output, reference, atol=1e-5)
@@ -0,0 +1,42 @@
+import torch
+
+import refiners.fluxion.layers as fl
+from refiners.fluxion.utils import no_grad
+from refiners.foundationals.latent_diffusion.cross_attention import CrossAttentionBlock, CrossAttentionBlock2d
+
+
+def test_fused_cross_attention_block_loads_unfused_weights() -> None:
+    block = CrossAttentionBlock(
+        embedding_dim=64, context_embedding_dim=32, context_key="clip_text_embedding", num_heads=4
+    )
+    fused_block = CrossAttentionBlock(
+        embedding_dim=64,
+        context_embedding_dim=32,
+        context_key="clip_text_embedding",
+        num_heads=4,
+        use_fused_projection=True,
+    )
+    fused_block.load_state_dict(block.state_dict())
+    fused_block.structural_copy().load_state_dict(block.state_dict())
+
+    x = torch.randn(2, 10, 64)
+    context = torch.randn(2, 7, 32)
+    for module in (block, fused_block):
+        module.set_context("cross_attention_block", {"clip_text_embedding": context})
+    with no_grad():
+        assert torch.allclose(fused_block(x), block(x), atol=1e-5)
+
+
+def test_cross_attention_block_2d_matches_channels_first_reference() -> None:
+    block = CrossAttentionBlock2d(
+        channels=64, context_embedding_dim=32, context_key="clip_text_embedding", num_attention_heads=4, num_groups=8
+    )
+    block.set_context("cross_attention_block", {"clip_text_embedding": torch.randn(2, 7, 32)})
+    in_block, attention_layers, out_block = block
+    assert isinstance(in_block, fl.Chain) and isinstance(out_block, fl.Chain)
+
+    x = torch.randn(2, 64, 8, 6)
+    with no_grad():
+        sequence = attention_layers(in_block[1](in_block[0](x)).flatten(2).transpose(1, 2))
+        expected = x + out_block[-1](sequence.transpose(1, 2).reshape(x.shape))
+        assert torch.allclose(block(x), expected, atol=1e-5)
@@ -1,8 +1,13 @@
+import pytest
 import torch
 
 from refiners.fluxion import manual_seed
+from refiners.fluxion.layers import Attention
 from refiners.fluxion.utils import no_grad
 from refiners.foundationals.latent_diffusion import SD1UNet
+from refiners.foundationals.latent_diffusion.image_prompt import CrossAttentionAdapter
+from refiners.foundationals.latent_diffusion.reference_only_control import ReferenceOnlyControlAdapter
+from refiners.foundationals.latent_diffusion.stable_diffusion_1.self_attention_guidance import SD1SAGAdapter
 
 
 def test_unet_context_flush():
@@ -23,3 +28,32 @@ def test_unet_context_flush():
         y_2 = unet(x.clone())
 
     assert torch.equal(y_1, y_2)
+
+
+def test_unet_fused_projection():
+    manual_seed(0)
+    text_embedding = torch.randn(1, 77, 768)
+    timestep = torch.randint(0, 999, size=(1, 1))
+    x = torch.randn(1, 4, 32, 32)
+
+    unet = SD1UNet(in_channels=4)
+    fused_unet = SD1UNet(in_channels=4, use_fused_projection=True)
+    fused_unet.load_state_dict(unet.state_dict())
+
+    with no_grad():
+        for model in (unet, fused_unet):
+            model.set_clip_text_embedding(clip_text_embedding=text_embedding)
+            model.set_timestep(timestep=timestep)
+        assert torch.allclose(fused_unet(x.clone()), unet(x.clone()), atol=1e-4)
+
+
+def test_unet_fused_projection_rejects_adapters():
+    unet = SD1UNet(in_channels=4, use_fused_projection=True)
+    cross_attention = next(attention for attention in unet.layers(Attention) if type(attention) == Attention)
+
+    with pytest.raises(ValueError, match="use_fused_projection=False"):
+        CrossAttentionAdapter(target=cross_attention)
+    with pytest.raises(ValueError, match="use_fused_projection=False"):
+        ReferenceOnlyControlAdapter(unet)
+    with pytest.raises(ValueError, match="use_fused_projection=False"):
+        SD1SAGAdapter(unet)